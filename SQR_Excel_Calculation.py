@@ -6,121 +6,237 @@ This script generates Supplier Quality Ratios (SQR) based on DMR (Defective Mate
 and exports the results to an Excel.
 
 It includes the functions of:
-1. Generate unique years or months from a Dataframe's date column.
+1. Generate unique years or months from a Dataframe's year and month columns.
 2. Generate counts of DMRs or POs for each unique year or month.
-3. Generate a bar chart of the top suppliers by SQR percentage for a specfic year. 
+3. Generate an Excel bar chart of the top suppliers by SQR percentage for a specfic year. 
+4. Calculate SQR percentages from arrays of DMR and PO counts.
+5. Count the DMRs or POs of every vendor in each year.
+6. Read the DMR Log and Supplier PO List, reusing a local Parquet copy when the files haven't changed.
 
 """
 import pandas as pd
+import numpy as np
 import os
-import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor
+
+#version of the Parquet cache, bump it whenever read_DMR_log or read_PO_list change what they return
+#so caches written by an older version of the readers are never used
+CACHE_VERSION = 2
 
 #Function generates a dictionary of counts for each unqiue year or month
-def generate_unique_list(df, option, date_column):
+def generate_unique_list(df, option):
     """
-    Generate a list of unique years or months from a Dataframe's date column.
+    Generate a list of unique years or months from a Dataframe's precomputed 'Year' and 'Month' columns.
 
     Parameters:
         df: Dataframe
-            Dataframe contianing the data column needed
+            Dataframe contianing the 'Year' and 'Month' columns
         option: string
             'Year' or 'Month' to generate list of unqiue years or months
-        date_column: string
-            Name of the data column in the Dataframe
 
     Returns:
-    List of unique years or months
+    Sorted list of unique years or months
     """
     #If-statement that checks the option parameter
     if option == 'Year': #Calculates the unique years and complies into a list if option is set to 'Year'
-        date_ = df[date_column].unique()
-        unique_DMRs_years = [] #creates empty list
-        for date_string in date_: #goes through every string in the date_ dataframe
-            year = date_string[:4] #extracts the year
-            if year not in unique_DMRs_years: #checks if current year is in unique list
-                unique_DMRs_years.append(year) #adds the current year into list
-        return unique_DMRs_years
+        return sorted(df['Year'].unique().tolist())
+    elif option == 'Month': #Calculates the unique months if option is set to 'Month'
+        return sorted(df['Month'].unique().tolist())
 
 #Function that generates a dictionary of counts for each unique year or month
-def generate_count_dict(df, option, date_column, unique_list):
+def generate_count_dict(df, option, unique_list):
     """
     Generates a dictionary of counts for each unique year or month.
 
     Parameters:
         df: dataframe
-            Dataframe containing the date column.
+            Dataframe containing the precomputed 'Year' and 'Month' columns.
         option: string
             'Year' or 'Month' to generate counts for unique years or months.
-        date_column: string
-            Name of the date column in the Dataframe.
         unqiue_list: list
             list of unique years or month
     
     Returns:
         dict: Dictionary containing counts for each unique year or month
     """
-    count_dict = {} #creating an empty dictionary
     if option == 'Year':
-        # Going through each year in unique list
-        for year in unique_list:
-                # Getting the count for the year in the DataFrame
-            count = (df[date_column].str[:4] == year).sum()
-                # Putting the year and its count into the dictionary
-            count_dict[year] = count
-        return count_dict
+        # Counting every year in one pass and keeping the years in unique list
+        counts = df['Year'].value_counts().reindex(unique_list, fill_value=0)
+        return counts.to_dict()
 
     elif option =="Month":
-        unique_years = df[date_column].str[:4].unique()
-        for yr in unique_years:
-            # dictionary that stores the month counts for current year
-            month_counts = {}
-            # iterates through the unique months
-            for month in unique_list:
-                # gets the counts for each month
-                count = (df[df[date_column].str[:4]==yr][date_column].str[5:7]==month).sum()
-                # stores the month counts in month dictionary
-                month_counts[month] = count
-            # stores month_counts dictionary for current year in official dictionary
-            count_dict[yr] = month_counts
-        return count_dict
-
-#Function that generates a bar chart of the top 8 suppliers by SQR percentages for a specific year 
-def generate_SQR_bar_chart(df_SQR, year):
+        # Counting every (year, month) pair in one groupby
+        counts = df.groupby(['Year', 'Month']).size()
+        # one row per year, one column per month in unique list
+        counts = counts.unstack(fill_value=0).reindex(columns=[int(month) for month in unique_list], fill_value=0)
+        counts.columns = unique_list
+        return counts.to_dict(orient='index')
+
+#Function that adds a bar chart of the top 8 suppliers by SQR percentages for a specific year to the Excel
+def generate_SQR_bar_chart(writer, df_SQR, year):
     """
-    Generate a horizontal bar chart of the top 8 suppliers with the highest SQR %
+    Writes the top 8 suppliers with the highest SQR % to a 'Bar Chart {year}' sheet
+    and adds a native Excel horizontal bar chart of them next to the data.
 
     Parameters:
+        writer: pandas ExcelWriter
+            xlsxwriter ExcelWriter of the SQR Excel
         df_SQR: dataframe
             Contains the SQR percentages for each vendor and year
-        year: string
+        year: int
             Year for whcih bar chart will be generated
     Returns:
         None
     """
     #need to do through the DF for specfic year
-    #find the top 8 suppliers w/ highest SQR%
-    sorted_year_SQR = df_SQR.sort_values(by=year,ascending= False)
-    top8_SQRs = sorted_year_SQR.head(8)
-
-    plt.figure(figsize=(15,8))
-    bars = plt.barh(top8_SQRs['Vendor'], top8_SQRs[year])
-    plt.xlabel('SQR Ratio')
-    plt.ylabel("Vendor")
-    plt.title(f"{year} Supplier Quality Ratios")
-    plt.gca().invert_yaxis() #inverting y-axis to have highest ratios at top
-    
-    plt.yticks(fontsize=7)
-    plt.yticks(rotation=55)
+    #find the top 8 suppliers w/ highest SQR%, vendors without an SQR that year are left out
+    top8_SQRs = df_SQR[['Vendor', year]].dropna(subset=[year]).nlargest(8, year)
+
+    #the chart reads its data from the sheet, so the top 8 go in columns A and B
+    sheet_name = f'Bar Chart {year}'
+    top8_SQRs.to_excel(writer, sheet_name=sheet_name, index=False)
+    last_row = len(top8_SQRs)
+    #no vendor has an SQR that year, so there is nothing to chart
+    if last_row == 0:
+        return
+
+    chart = writer.book.add_chart({'type': 'bar'})
+    chart.add_series({
+        'name': f'{year} SQR',
+        'categories': [sheet_name, 1, 0, last_row, 0],
+        'values': [sheet_name, 1, 1, last_row, 1],
+        'data_labels': {'value': True, 'num_format': '0.00'},
+    })
+    chart.set_title({'name': f'{year} Supplier Quality Ratios'})
+    chart.set_x_axis({'name': 'SQR Ratio'})
+    chart.set_y_axis({'name': 'Vendor', 'reverse': True}) #reversing the vendor axis to have highest ratios at top
+    chart.set_legend({'none': True})
+    chart.set_size({'width': 1080, 'height': 576})
+
+    writer.sheets[sheet_name].insert_chart('D2', chart)
+
+#Function that calculates the SQR percentages from DMR and PO count arrays
+def calculate_SQR_percentages(dmr_counts, po_counts):
+    """
+    Calculates the SQR percentage (DMR count / PO count * 100) for every element of two count arrays.
 
-    for bar, pct in zip(bars, top8_SQRs[year]):
-        plt.text(bar.get_width(), bar.get_y()+bar.get_height()/2, f'{pct:.2f}', ha='left', va='center')
+    Parameters:
+        dmr_counts: numpy array
+            DMR counts, NaN where there are no DMRs
+        po_counts: numpy array
+            PO counts with the same shape as dmr_counts, NaN where there are no POs
+    Returns:
+        numpy array: float64 SQR percentages, NaN wherever there is no PO count or it is zero
+    """
+    sqr = np.full(np.shape(dmr_counts), np.nan, dtype=np.float64)
+    #only dividing where there are POs, everything else stays NaN
+    np.divide(dmr_counts, po_counts, out=sqr, where=po_counts > 0)
+    sqr *= 100
+    return sqr
+
+#Function that counts the DMRs or POs of every vendor in each year
+def count_vendors_by_year(df, vendor_column, count_name):
+    """
+    Counts the rows of every vendor for each year.
 
-    plt.axvline(color='white', zorder=2)
+    Parameters:
+        df: dataframe
+            Dataframe containing the precomputed 'Year' column and the categorical vendor column
+        vendor_column: string
+            Name of the vendor column in the Dataframe
+        count_name: string
+            Name of the count column in the returned Dataframe
+    Returns:
+        Dataframe with 'Year', 'Vendor' and count_name columns
+    """
+    # The vendors are stored as a category when read, so grouping works on integer codes instead of strings
+    vendors = df[vendor_column].rename('Vendor')
+    # Grouping by year and vendor and counting the occurrences
+    counts = df.groupby([df['Year'], vendors], observed=True).size().reset_index(name=count_name)
+    # Counts are small, so they're stored in the smallest unsigned integer type that fits
+    counts[count_name] = pd.to_numeric(counts[count_name], downcast='unsigned')
+    return counts
+
+#Function that reads in the DMR Log and cleans it up
+def read_DMR_log(file_path):
+    """
+    Reads the Date and Vendor columns of the DMR Log into a Dataframe and parses the dates.
 
-    plt.gca().spines['top'].set_visible(False)
-    plt.gca().spines['right'].set_visible(False)
+    Parameters:
+        file_path: string
+            Path of the DMR Log Excel file
+    Returns:
+        Dataframe of the DMR Log
+    """
+    #calamine (Rust) parses xlsx files much faster than openpyxl
+    #only the columns used in the SQR calculations are parsed
+    DMR_df = pd.read_excel(file_path, engine='calamine', usecols=['Date', 'Vendor'])
+
+    #keeping the dates as datetime, dates that can't be parsed become NaT
+    DMR_df['Date'] = pd.to_datetime(DMR_df['Date'], errors='coerce')
+    #filtering out rows that don't have a valid date
+    DMR_df = DMR_df.dropna(subset=['Date'])
+    #extracting the year and month once so every count can reuse them
+    DMR_df = DMR_df.assign(Year=DMR_df['Date'].dt.year.astype('int32'), Month=DMR_df['Date'].dt.month.astype('int8'))
+    #storing the vendors as a category once, the Parquet cache keeps it so it's not rebuilt every run
+    DMR_df['Vendor'] = DMR_df['Vendor'].astype('category')
+    return DMR_df
+
+#Function that reads in the Supplier PO List
+def read_PO_list(file_path):
+    """
+    Reads the Supplier PO List into a Dataframe and parses the P.O. dates.
 
-    plt.savefig(f'bar_chart_{year}.png')
+    Parameters:
+        file_path: string
+            Path of the Supplier PO List CSV file
+    Returns:
+        Dataframe of the Supplier PO List
+    """
+    #pyarrow's multi-threaded CSV reader, the P.O. dates are parsed as part of the read
+    supplier_PO_df = pd.read_csv(file_path, encoding='latin1', engine='pyarrow', parse_dates=['P.O. Date'])
+    #filtering out rows that don't have a valid date
+    supplier_PO_df = supplier_PO_df.dropna(subset=['P.O. Date'])
+    #extracting the year and month once so every count can reuse them
+    supplier_PO_df = supplier_PO_df.assign(Year=supplier_PO_df['P.O. Date'].dt.year.astype('int32'),
+                                           Month=supplier_PO_df['P.O. Date'].dt.month.astype('int8'))
+    #storing the vendors as a category once, the Parquet cache keeps it so it's not rebuilt every run
+    supplier_PO_df['Vendor Name'] = supplier_PO_df['Vendor Name'].astype('category')
+    return supplier_PO_df
+
+#Function that reuses a local Parquet copy of a file when the file hasn't changed
+def read_with_parquet_cache(file_path, read_file):
+    """
+    Reads a file into a Dataframe through a local Parquet cache.
+    The cache is used as long as it is newer than the file and was written by the current CACHE_VERSION,
+    otherwise the file is read again and the cache rewritten.
+
+    Parameters:
+        file_path: string
+            Path of the Excel or CSV file
+        read_file: function
+            Named function that reads file_path into a Dataframe, its name is part of the cache name
+    Returns:
+        Dataframe of the file's data
+    """
+    #cache is kept in the working directory so nothing gets written to the shared folder
+    #the reader's name is part of the cache name, so readers (including the other SQR script's) never share a cache
+    #the version is part of the name, so a cache of an older reader's output is never read
+    cache_path = f'{os.path.basename(file_path)}.{read_file.__name__}.v{CACHE_VERSION}.parquet'
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+        return pd.read_parquet(cache_path)
+
+    df = read_file(file_path)
+    #writing to a temporary file first and swapping it in, so an interrupted run never leaves a half-written cache
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except (ValueError, TypeError):
+        #columns with mixed types can't be stored in Parquet, the file will just be read again next run
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return df
 
 #UNC path to access the DMR Log
 server_name= "empowering.apcd.local"
@@ -132,26 +248,23 @@ DMR_filename = 'DMR MASTER LIST - USE THIS LOG.xlsx'
 #getting the file path for DMR Log
 file_path = os.path.join(r'\\', server_name, share_name, folder_name, DMR_folder_name, DMR_filename)
 #reading in the Log into a dataframe
-DMR_df = pd.read_excel(file_path)
-
-#getting rid of any unnamed columns
-unnamed_columns = [col for col in DMR_df.columns if 'Unnamed' in col]
-DMR_df = DMR_df.drop(columns=unnamed_columns)
-DMR_df['Date'] = DMR_df['Date'].astype('str')
+DMR_df = read_with_parquet_cache(file_path, read_DMR_log)
 
 #getting the Supplier PO data into a dataframe
 PO_filename = "Supplier PO List.csv"
-supplier_PO_df = pd.read_csv(PO_filename, encoding='latin1')
-supplier_PO_df['P.O. Date'] = pd.to_datetime(supplier_PO_df['P.O. Date'])
-supplier_PO_df['P.O. Date'] = supplier_PO_df['P.O. Date'].astype('str')
+supplier_PO_df = read_with_parquet_cache(PO_filename, read_PO_list)
 
 #getting the unique years list for the DMR and PO data
-dmrs_years = generate_unique_list(DMR_df, 'Year', 'Date')
-PO_years = generate_unique_list(supplier_PO_df, 'Year', 'P.O. Date')
+dmrs_years = generate_unique_list(DMR_df, 'Year')
+PO_years = generate_unique_list(supplier_PO_df, 'Year')
 
 #getting the count dictionary for each year for DMR and PO data
-DMRs_yrs_count = generate_count_dict(DMR_df, 'Year', 'Date', dmrs_years)
-PO_yrs_count = generate_count_dict(supplier_PO_df, 'Year', 'P.O. Date', PO_years)
+#the DMR and PO counts don't depend on each other, so they're calculated at the same time
+with ThreadPoolExecutor(max_workers=2) as executor:
+    DMRs_yrs_future = executor.submit(generate_count_dict, DMR_df, 'Year', dmrs_years)
+    PO_yrs_future = executor.submit(generate_count_dict, supplier_PO_df, 'Year', PO_years)
+    DMRs_yrs_count = DMRs_yrs_future.result()
+    PO_yrs_count = PO_yrs_future.result()
 
 #creating DMR to PO percentage ratio dictionary
 DMR_PO_perc_yr = {}
@@ -169,8 +282,11 @@ for year in dmrs_years:
 unique_months = ['01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12']
 
 #getting count dictionary for each month for DMR and PO data
-DMRs_month_count = generate_count_dict(DMR_df, 'Month', 'Date', unique_months)
-PO_month_count = generate_count_dict(supplier_PO_df, 'Month', 'P.O. Date', unique_months)
+with ThreadPoolExecutor(max_workers=2) as executor:
+    DMRs_month_future = executor.submit(generate_count_dict, DMR_df, 'Month', unique_months)
+    PO_month_future = executor.submit(generate_count_dict, supplier_PO_df, 'Month', unique_months)
+    DMRs_month_count = DMRs_month_future.result()
+    PO_month_count = PO_month_future.result()
 
 #creating DMR to PO percentage ratio dictionary
 DMR_PO_perc_month = {}
@@ -190,7 +306,7 @@ for year in sorted(set(DMRs_month_count.keys()) & set(PO_month_count.keys())):
 #converting the yearly and monthly ratios to dataframes
 df_yr = pd.DataFrame(DMR_PO_perc_yr, index = ['SQR Percentage'])
 #making sure that the only years are numbers & nothing else
-df_yr = df_yr[[col for col in df_yr.columns if col.isdigit()]]
+df_yr = df_yr[[col for col in df_yr.columns if isinstance(col, (int, np.integer))]]
 df_month = pd.DataFrame(DMR_PO_perc_month)
 df_month.index.name='Month'
 
@@ -198,85 +314,23 @@ df_month.index.name='Month'
 df_yr = df_yr.round(1)
 df_month = df_month.round(1)
 
-#creating dataframe that holds the vendors DMR count and the coresponding year
-DMR_df['Year'] = DMR_df['Date'].str[:4]
-# Filtering out rows where 'Year' is not a valid year
-DMR_df = DMR_df[DMR_df['Year'].str.isdigit()]
-# Converting 'Year' to integer type
-DMR_df['Year'] = DMR_df['Year'].astype(int)
-# Grouping the DataFrame by 'Year' and 'Vendor' and counting the occurrences
-vendors_yr_DMR_count_df = DMR_df.groupby(['Year', 'Vendor']).size().reset_index(name='DMR Count')
-
-#creating Dataframe for the POs vendor count 
-supplier_PO_df['Year'] = supplier_PO_df['P.O. Date'].str[:4]
-# Filtering out rows where 'Year' is not a valid year
-supplier_PO_df = supplier_PO_df[supplier_PO_df['Year'].str.isdigit()]
-# Converting 'Year' to integer type
-supplier_PO_df['Year'] = supplier_PO_df['Year'].astype(int)
-# Grouping the DataFrame by 'Year' and 'Vendor' and counting the occurrences
-vendors_yr_PO_count_df = supplier_PO_df.groupby(['Year', 'Vendor Name']).size().reset_index(name='DMR Count')
-
-#creating dictionaries to hold the DMR + PO vendors counts
-vendor_DMR_counts = {}
-vendor_PO_counts = {}
-
-#iterates through each row in the dataframe
-#row = pandas series of the vendors year data
-for index, row in vendors_yr_DMR_count_df.iterrows():
-    #extracting the year, vendor, + count from the row Series
-    year = row['Year']
-    vendor = row['Vendor']
-    count = row['DMR Count']
-    #checking if the given vendor is present as a key in 'vendor_DMR_counts'
-    if vendor not in vendor_DMR_counts:
-        #initialiszes an empty dictionary for that vendor
-        vendor_DMR_counts[vendor] = {}
-    #adds an entry to the dictionary
-    vendor_DMR_counts[vendor][year] = count
-
-#same thing as above but for the PO dictionary
-for index, row in vendors_yr_PO_count_df.iterrows():
-    year = row['Year']
-    vendor = row['Vendor Name']
-    count = row['DMR Count']
-    if vendor not in vendor_PO_counts:
-        vendor_PO_counts[vendor]={}
-
-    vendor_PO_counts[vendor][year] = count
+#creating dataframes that hold the vendors DMR and PO counts for each year
+#rows without a valid date were already dropped when reading the files
+with ThreadPoolExecutor(max_workers=2) as executor:
+    DMR_vendors_future = executor.submit(count_vendors_by_year, DMR_df, 'Vendor', 'DMR Count')
+    PO_vendors_future = executor.submit(count_vendors_by_year, supplier_PO_df, 'Vendor Name', 'PO Count')
+    vendors_yr_DMR_count_df = DMR_vendors_future.result()
+    vendors_yr_PO_count_df = PO_vendors_future.result()
 
-#creating DMR to PO percentage ratio dictionary
-vendor_SQR_ratios = {}
-#iterates over the items in 'vendor_DMR_counts'
-for vendor, dmr_counts_per_year in vendor_DMR_counts.items():
-    #checking if vendor is a part of 'vendor_SQR_ratios'
-    if vendor not in vendor_SQR_ratios:
-        vendor_SQR_ratios[vendor] = {} #creates new dictionary slot for new vendor
-    #iterates through the years in dictionary
-    for year in dmr_counts_per_year:
-        #checks if vendor exists in 'vendor_PO_counts' dictionary and if year exists for that vendor
-        if vendor in vendor_PO_counts and year in vendor_PO_counts[vendor]:
-            #retrives the PO count for current vendor and year
-            po_count = vendor_PO_counts[vendor][year]
-            #checks if po_count is not zero
-            if po_count !=0:
-                #gets dmr count for current vendor and year
-                dmr_count = dmr_counts_per_year[year]
-                #calculates the SQR percentage
-                ratio = (dmr_count/po_count) *100
-                #stores the calculated SQR percentage in the 'vendor_SQR_ratio' dictionary
-                vendor_SQR_ratios[vendor][year]=ratio
-        else:
-            #assigns None to the SQR ratio
-            vendor_SQR_ratios[vendor][year]= None
+#joining the PO counts onto the DMR counts by vendor and year
+#vendors/years without POs get a NaN PO count, the same as the old None entries
+merged = vendors_yr_DMR_count_df.merge(vendors_yr_PO_count_df, on=['Year', 'Vendor'], how='left')
+#calculating the SQR percentage for every vendor and year at once
+merged['SQR'] = calculate_SQR_percentages(merged['DMR Count'].to_numpy(dtype=np.float64), merged['PO Count'].to_numpy(dtype=np.float64))
 
-#converting the 'vendor_SQR_ratios' dictionary to a dataframe
-df_vendor_SQR_ratios = pd.DataFrame(vendor_SQR_ratios)
-#transposing dataframe so it is easier to use
-df_vendor_SQR_ratios = df_vendor_SQR_ratios.T
-
-df_vendor_SQR_ratios.reset_index(inplace=True)
-#renaming columns to have vendor
-df_vendor_SQR_ratios.rename(columns={'index':'Vendor'}, inplace = True)
+#pivoting into one row per vendor and one column per year
+df_vendor_SQR_ratios = merged.pivot(index='Vendor', columns='Year', values='SQR').reset_index()
+df_vendor_SQR_ratios.columns.name = None
 
 #using UNC path to export the excel sheet to the Supplie Quality Ratios folder
 server_name= "empowering.apcd.local"
@@ -290,7 +344,8 @@ file_name = 'SQR Calculation.xlsx'
 file_path = os.path.join(r'\\', server_name, share_name, folder_name,subfolder1 ,subfolder2, file_name)
 
 #exporting dataframes and bar charts to Excel
-with pd.ExcelWriter(file_path) as writer:
+#xlsxwriter is set explicitly since the charts are inserted with its worksheet API
+with pd.ExcelWriter(file_path, engine='xlsxwriter') as writer:
     df_yr.to_excel(writer, sheet_name='Yearly SQR Percentages')
     df_month.to_excel(writer, sheet_name='Monthly SQR Percentages')
     df_vendor_SQR_ratios.to_excel(writer, sheet_name = "Vendor SQR Percentages")
@@ -299,14 +354,5 @@ with pd.ExcelWriter(file_path) as writer:
     unique_years = sorted(set(PO_years).intersection(dmrs_years))
 
     for year in unique_years:
-        #generates the SQR bar chart
-        generate_SQR_bar_chart(df_vendor_SQR_ratios, int(year))
-
-        # Creating new sheet in Excel to place the chart
-        bar_chart_sheet = pd.DataFrame()
-        bar_chart_sheet.to_excel(writer, sheet_name=f'Bar Chart {year}')
-
-        # Inserting the chart image into the Excel sheet
-        workbook = writer.book
-        worksheet = writer.sheets[f'Bar Chart {year}']
-        worksheet.insert_image('A1', f'bar_chart_{year}.png')
+        #writes the top 8 vendors and their SQR bar chart to a new sheet
+        generate_SQR_bar_chart(writer, df_vendor_SQR_ratios, int(year))
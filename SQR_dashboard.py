@@ -13,45 +13,42 @@ Dashboard contains:
 - SQR(SupplierQuality Ratio): the # of DMRs generated by a supplier
     to the numper of POs submitted w/ a supplier
 """
+import os
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from matplotlib.figure import Figure
+
+#version of the Parquet cache, bump it whenever read_raw_DMR_log or read_raw_PO_list change what they read
+#so caches written by an older version of the readers are never used
+CACHE_VERSION = 3
 
 st.set_page_config(layout='wide',
                    initial_sidebar_state="expanded")
 @st.cache_data
-def generate_unique_list(df, option, date_column):
+def generate_unique_list(dates, option):
     """
-    Generate a list of unique years or months from a Dataframe's date column.
+    Generate a list of unique years or months from a parsed date column.
 
     Parameters:
-        df: Dataframe
-            Dataframe contianing the data column needed
+        dates: Series
+            datetime Series of the dates, dates that couldn't be parsed are NaT
         option: string
             'Year' or 'Month' to generate list of unqiue years or months
-        date_column: string
-            Name of the data column in the Dataframe
 
     Returns:
-        List of unique years or months
+        Sorted list of unique years (e.g. '2019') or months (e.g. '01') as strings
     """
     if option == 'Year':
-        date_ = df[f'{date_column}'].unique()
-        unique_DMRs_years = []
-        for date_string in date_:
-            year = date_string[:4]
-            if year not in unique_DMRs_years: 
-                unique_DMRs_years.append(year)
-        return unique_DMRs_years
+        years = dates.dt.year.dropna().astype(int).unique()
+        return [str(year) for year in sorted(years)]
     elif option == 'Month':
-        date_ = df[f'{date_column}'].unique()
-        unique_DMRs_months = []
-        for date_string in date_:
-            month = date_string[:4]
-            if month not in unique_DMRs_months: 
-                unique_DMRs_months.append(month)
-        return unique_DMRs_months
+        months = dates.dt.month.dropna().astype(int).unique()
+        return [f'{month:02d}' for month in sorted(months)]
     
 @st.cache_data
 def generate_count_dict(df, option, date_column, unique_list):
@@ -71,30 +68,24 @@ def generate_count_dict(df, option, date_column, unique_list):
     Returns:
         dict: Dictionary containing counts for each unique year or month
     """
-    count_dict = {}
+    #dropping dates that couldn't be parsed
+    dates = df[date_column].dropna()
+    #grouping on the integer years/months, only the small counts index is turned into 'YYYY'/'MM' strings
+    year = dates.dt.year.rename('Year')
     if option == 'Year':
-        # Going through each year in unique list
-        for year in unique_list:
-                # Getting the count for the year in the DataFrame
-            count = (df[date_column].str[:4] == year).sum()
-                # Putting the year and its count into the dictionary
-            count_dict[year] = count
-        return count_dict
+        # Counting every year in one pass and keeping the years in unique list
+        counts = year.value_counts()
+        counts.index = counts.index.astype(str)
+        return counts.reindex(unique_list, fill_value=0).to_dict()
 
     elif option =="Month":
-        unique_years = df[date_column].str[:4].unique()
-        for yr in unique_years:
-            # dictionary that stores the month counts for current year
-            month_counts = {}
-            # iterates through the unique months
-            for month in unique_list:
-                # gets the counts for each month
-                count = (df[df[date_column].str[:4]==yr][date_column].str[5:7]==month).sum()
-                # stores the month counts in month dictionary
-                month_counts[month] = count
-            # stores month_counts dictionary for current year in official dictionary
-            count_dict[yr] = month_counts
-        return count_dict
+        month = dates.dt.month.rename('Month')
+        # Counting every (year, month) pair in one groupby, one row per year and one column per month
+        counts = dates.groupby([year, month]).size().unstack(fill_value=0)
+        counts.index = counts.index.astype(str)
+        counts.columns = [f'{month:02d}' for month in counts.columns]
+        counts = counts.reindex(columns=unique_list, fill_value=0)
+        return counts.to_dict(orient='index')
     
 @st.cache_data
 def generate_SQR_bar_chart(df_SQR, year):
@@ -111,65 +102,45 @@ def generate_SQR_bar_chart(df_SQR, year):
             Plotly figure object containing the horizontal bar chart.
     """
     #need to do through the DF for specfic year
-    #find the top 8 suppliers w/ highest SQR%
-    sorted_year_SQR = df_SQR[['Vendor', year]].dropna(subset=[year]).sort_values(by=year, ascending=False)
-    top8_SQRs = sorted_year_SQR.head(8)
-
-    # Create the horizontal bar chart using Plotly Express
-    fig = px.bar(top8_SQRs, x=year, y='Vendor', orientation='h', title=f'{year} Supplier Quality Ratios',
-                 labels={'Vendor': 'Vendor', year: 'SQR Ratio'})
-
-    fig.update_traces(text=top8_SQRs[year].map('{:.2f}'.format), textposition='outside')
-
-    # Customize layout
-    fig.update_layout(
-        yaxis={'categoryorder': 'total ascending'},  # Ensure bars are sorted by SQR Ratio
-        xaxis_title='SQR Ratio',
-        yaxis_title='Vendor',
-        yaxis_tickfont=dict(size=10),
-        height=500,
-        width=500
+    #find the top 8 suppliers w/ highest SQR%, nlargest only keeps the top 8 instead of sorting every vendor
+    top8_SQRs = df_SQR[['Vendor', year]].dropna(subset=[year]).nlargest(8, year)
+
+    # Create the horizontal bar chart directly with graph_objects
+    fig = go.Figure(
+        data=go.Bar(x=top8_SQRs[year], y=top8_SQRs['Vendor'], orientation='h',
+                    text=top8_SQRs[year].map('{:.2f}'.format), textposition='outside'),
+        layout=dict(
+            title=f'{year} Supplier Quality Ratios',
+            yaxis=dict(categoryorder='total ascending',  # Ensure bars are sorted by SQR Ratio
+                       title='Vendor', tickfont=dict(size=10)),
+            xaxis=dict(title='SQR Ratio'),
+            height=500,
+            width=500
+        )
     )
     return fig
 
 
-@st.cache_data
-# Function to calculate and plot Process Behavior Chart (PBC) for specific vendors and year
-def calculate_and_plot_pbc(vendor, year, raw_df):
+# Function that calculates the moving ranges and process limits of a Process Behavior Chart (PBC)
+def calculate_pbc_limits(counts):
     """
-    Calculates and plots the Process Behavior Chart (PBC) for specific vendors and year.
+    Calculates the moving ranges, mean and process limits for a PBC in one vectorized pass.
 
     Parameters:
-        vendor: string
-            Name of the vendor.
-        year: int
-            Year for which the chart is generated
-        raw_df: Dataframe
-            Raw dataframe containing the DMRs and dates. It is the DMR log.
+        counts: array-like
+            Monthly DMR counts, in month order
     Returns:
-        BytesIO: Buffer contianing the plotted PBC chart image. Will be used to download the PBC in the dashbaord. 
+        tuple: moving ranges array, mean, UPL, LPL, URL
     """
-    # Convert 'Date' column to datetime
-    raw_df['Date'] = pd.to_datetime(raw_df['Date'], errors='coerce')
-
-    # Gather data for the specified vendor and year
-    vendor_data = raw_df[(raw_df['Vendor'] == vendor) & (raw_df['Date'].dt.year == year)]
-
-    # Extract 'Year-Month' from 'Date'
-    vendor_data['Year-Month'] = vendor_data['Date'].dt.to_period('M').astype(str)
-
-    # Grouping by 'Year-Month' and counting the number of DMRs
-    dmr_per_month = vendor_data.groupby('Year-Month').size().reset_index(name='DMRs Count')
-    # Sorting the dataframe by 'Year-Month' order
-    dmr_per_month = dmr_per_month.sort_values('Year-Month')
+    counts = np.asarray(counts, dtype=float)
+    if counts.size == 0:
+        raise ValueError("No DMR counts to calculate the process limits from")
 
     # Calculating MEAN
-    mean_dmr = dmr_per_month['DMRs Count'].mean()
+    mean_dmr = counts.mean()
 
-    # Calculating moving ranges
-    moving_ranges = [0] + [abs(next_val - current_val) for current_val, next_val in zip(dmr_per_month['DMRs Count'][:-1], dmr_per_month['DMRs Count'][1:])]
-
-    dmr_per_month['Moving Ranges'] = moving_ranges
+    # Calculating moving ranges, the first month has no previous month so its range is 0
+    moving_ranges = np.abs(np.diff(counts, prepend=counts[0]))
     average_moving_ranges = moving_ranges[-1]
 
     # Calculating the process limits
@@ -181,95 +152,287 @@ def calculate_and_plot_pbc(vendor, year, raw_df):
         LPL = mean_dmr
     URL = average_moving_ranges * 3.27
 
-    dmr_per_month['UPL'] = UPL
-    dmr_per_month['LPL'] = LPL
-    dmr_per_month['URL'] = URL
-
-    # Plotting PBC chart using Plotly Express
-    fig = px.line(dmr_per_month, x='Year-Month', y='DMRs Count', title=f'PBC For {vendor} in {year}',
-                  labels={'DMRs Count': 'Counts', 'Year-Month': 'Index'},
-                  template='plotly_white',
-                  markers=True)
-    fig.add_hline(y=mean_dmr, line_dash="dash", line_color="blue", annotation_text=f'Mean: {mean_dmr:.3f}', annotation_position="bottom right")
-    fig.add_hline(y=UPL, line_dash="dash", line_color="red", annotation_text=f'UPL: {UPL:.3f}', annotation_position="bottom right")
-    fig.add_hline(y=LPL, line_dash="dash", line_color="red", annotation_text=f'LPL: {LPL:.3f}', annotation_position="bottom right")
-
-    # Set the figure layout to add a black border
-    fig.update_layout(
-        margin=dict(l=20, r=20, t=60, b=20),
-        paper_bgcolor="white",  # Set background color to transparent
-        plot_bgcolor="white",   # Set plot color to transparent
-        xaxis=dict(linecolor="black", linewidth=2),  # Set X-axis line color and width
-        yaxis=dict(linecolor="black", linewidth=2),  # Set Y-axis line color and width
-        )
+    return moving_ranges, mean_dmr, UPL, LPL, URL
+
+# Function that draws the PBC as a PNG image with Matplotlib
+def render_pbc_png(dmr_per_month, vendor, year, mean_dmr, UPL, LPL):
+    """
+    Draws the PBC with Matplotlib's Agg renderer, which runs in-process instead of starting a browser like Kaleido.
+
+    Parameters:
+        dmr_per_month: Dataframe
+            Monthly DMR counts with 'Year-Month' and 'DMRs Count' columns
+        vendor: string
+            Name of the vendor.
+        year: int
+            Year for which the chart is generated
+        mean_dmr, UPL, LPL: float
+            Mean and process limits drawn as dashed lines
+    Returns:
+        BytesIO: Buffer containing the PBC chart as a PNG image
+    """
+    fig = Figure(figsize=(10, 5))
+    ax = fig.add_subplot()
+    ax.plot(dmr_per_month['Year-Month'], dmr_per_month['DMRs Count'], marker='o')
+    for value, label, color in ((mean_dmr, 'Mean', 'blue'), (UPL, 'UPL', 'red'), (LPL, 'LPL', 'red')):
+        ax.axhline(value, linestyle='--', color=color)
+        ax.annotate(f'{label}: {value:.3f}', xy=(1, value), xycoords=('axes fraction', 'data'), ha='right', va='top')
+    ax.set_title(f'PBC For {vendor} in {year}')
+    ax.set_xlabel('Index')
+    ax.set_ylabel('Counts')
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', dpi=150)
+    buffer.seek(0)
+    return buffer
+
+# Function that counts the DMRs of every vendor for every month in one pass
+def count_monthly_DMRs(raw_df):
+    """
+    Counts the DMRs of every vendor for every month with a single groupby, so each PBC only has to look up its counts.
+
+    Parameters:
+        raw_df: Dataframe
+            DMR dataframe with the 'Date' column parsed to datetime
+    Returns:
+        Series: DMR counts indexed by ('Vendor', 'Year', 'Year-Month'), sorted by month
+    """
+    years = raw_df['Date'].dt.year.rename('Year')
+    year_months = raw_df['Date'].dt.to_period('M').astype(str).rename('Year-Month')
+    return raw_df.groupby([raw_df['Vendor'], years, year_months], observed=True).size()
+
+@st.cache_data
+# Function that calculates the numbers behind a Process Behavior Chart (PBC) for a specific vendor and year
+def calculate_pbc_stats(vendor, year, monthly_DMRs):
+    """
+    Calculates the monthly DMR counts, moving ranges and process limits of a PBC for a specific vendor and year.
+
+    Parameters:
+        vendor: string
+            Name of the vendor.
+        year: int
+            Year for which the chart is generated
+        monthly_DMRs: Series
+            DMR counts indexed by ('Vendor', 'Year', 'Year-Month') from count_monthly_DMRs
+    Returns:
+        tuple: months array, DMR counts array, moving ranges array, mean, UPL, LPL, URL
+    """
+    try:
+        # Gather the monthly counts for the specified vendor and year
+        vendor_counts = monthly_DMRs.loc[(vendor, year)]
+    except KeyError:
+        raise ValueError(f"No DMRs for {vendor} in {year}")
+
+    counts = vendor_counts.to_numpy()
+    moving_ranges, mean_dmr, UPL, LPL, URL = calculate_pbc_limits(counts)
+    return vendor_counts.index.to_numpy(), counts, moving_ranges, mean_dmr, UPL, LPL, URL
+
+@st.cache_data
+# Function to calculate and plot Process Behavior Chart (PBC) for specific vendors and year
+def calculate_and_plot_pbc(vendor, year, monthly_DMRs, high_resolution=False):
+    """
+    Calculates and plots the Process Behavior Chart (PBC) for specific vendors and year.
+
+    Parameters:
+        vendor: string
+            Name of the vendor.
+        year: int
+            Year for which the chart is generated
+        monthly_DMRs: Series
+            DMR counts indexed by ('Vendor', 'Year', 'Year-Month') from count_monthly_DMRs.
+            It is small, so hashing it for the cache key is cheap, unlike the whole DMR log.
+        high_resolution: bool
+            If True the PNG is exported from the Plotly chart with Kaleido (slow), otherwise it is drawn with Matplotlib
+    Returns:
+        BytesIO: Buffer contianing the plotted PBC chart image. Will be used to download the PBC in the dashbaord. 
+    """
+    # Getting the monthly counts and process limits (cached per vendor and year)
+    months, counts, moving_ranges, mean_dmr, UPL, LPL, URL = calculate_pbc_stats(vendor, year, monthly_DMRs)
+
+    dmr_per_month = pd.DataFrame({'Year-Month': months, 'DMRs Count': counts, 'Moving Ranges': moving_ranges,
+                                  'UPL': UPL, 'LPL': LPL, 'URL': URL})
+
+    # Plotting PBC chart, with the mean and process limits drawn as dashed lines across the plot
+    limit_lines = ((mean_dmr, 'Mean', 'blue'), (UPL, 'UPL', 'red'), (LPL, 'LPL', 'red'))
+    fig = go.Figure({
+        'data': [go.Scatter(x=dmr_per_month['Year-Month'], y=dmr_per_month['DMRs Count'], mode='lines+markers')],
+        'layout': {
+            'title': f'PBC For {vendor} in {year}',
+            'template': 'plotly_white',
+            'shapes': [dict(type='line', xref='paper', x0=0, x1=1, y0=value, y1=value, line=dict(color=color, dash='dash'))
+                       for value, label, color in limit_lines],
+            'annotations': [dict(xref='paper', x=1, y=value, text=f'{label}: {value:.3f}', showarrow=False,
+                                 xanchor='right', yanchor='top')
+                            for value, label, color in limit_lines],
+            # Set the figure layout to add a black border
+            'margin': dict(l=20, r=20, t=60, b=20),
+            'paper_bgcolor': "white",
+            'plot_bgcolor': "white",
+            'xaxis': dict(title='Index', linecolor="black", linewidth=2),  # Set X-axis line color and width
+            'yaxis': dict(title='Counts', linecolor="black", linewidth=2),  # Set Y-axis line color and width
+        },
+    })
 
     st.plotly_chart(fig, use_container_width=True)
 
+    if not high_resolution:
+        return render_pbc_png(dmr_per_month, vendor, year, mean_dmr, UPL, LPL)
+
     buffer = BytesIO()
     fig.write_image(buffer, format='png', scale=2)
     buffer.seek(0)
     return buffer
 
-DMR_df = pd.read_excel("Example_DMR_Log.xlsx")
-supplier_PO_df = pd.read_csv("Example_Supplier PO List.csv", encoding='latin1')
+# Function that reads the DMR Log Excel file as it is
+def read_raw_DMR_log(file_path):
+    """
+    Reads the DMR Log Excel file into a Dataframe without cleaning it up.
 
-#checking if the DMR and PO dataframe has data in them
-if DMR_df is not None and supplier_PO_df is not None:
-    #getting rid of any unnamed columns
-    unnamed_columns = [col for col in DMR_df.columns if 'Unnamed' in col]
-    DMR_df = DMR_df.drop(columns=unnamed_columns)
-    DMR_df['Date'] = DMR_df['Date'].astype('str')
-
-    #getting the Supplier PO data into a dataframe
-    supplier_PO_df['P.O. Date'] = pd.to_datetime(supplier_PO_df['P.O. Date'])
-    supplier_PO_df['P.O. Date'] = supplier_PO_df['P.O. Date'].astype('str')
-
-    dmrs_years = generate_unique_list(DMR_df, 'Year', 'Date')
-    PO_years = generate_unique_list(supplier_PO_df, 'Year', 'P.O. Date')
-
-    # print("\n", "\n")
-    DMRs_yrs_count = generate_count_dict(DMR_df, 'Year', 'Date', dmrs_years)
-    # print("1: ",DMRs_yrs_count)
-    PO_yrs_count = generate_count_dict(supplier_PO_df, 'Year', 'P.O. Date', PO_years)
-
-    #creating DMR to PO percentage ratio dictionary
-    DMR_PO_perc_yr = {}
-    #calcualting DMR to PO percentage ratio for each year
-    for year in dmrs_years:
-        #checking if year is in PO_count dictionary
-        if year in PO_yrs_count:
-            #gets percentage ratio
-            ratio = (DMRs_yrs_count[year]/PO_yrs_count[year])*100
-            DMR_PO_perc_yr[year] = ratio 
-        else:
-            DMR_PO_perc_yr[year]=None
-    # print(DMR_PO_perc_yr)
+    Parameters:
+        file_path: string
+            Path of the DMR Log Excel file
+    Returns:
+        Dataframe of the DMR Log
+    """
+    # the unnamed (blank header) columns are left out of the Dataframe, same rule as before ('Unnamed' anywhere in the name)
+    # openpyxl still reads their cells, usecols only keeps them out of the result
+    return pd.read_excel(file_path, usecols=lambda col: 'Unnamed' not in str(col))
+
+# Function that reads the Supplier PO List CSV file
+def read_raw_PO_list(file_path):
+    """
+    Reads the Supplier PO List CSV file into a Dataframe with the P.O. dates parsed.
+
+    Parameters:
+        file_path: string
+            Path of the Supplier PO List CSV file
+    Returns:
+        Dataframe of the Supplier PO List
+    """
+    #pyarrow's multi-threaded CSV reader, the P.O. dates are parsed as part of the read
+    return pd.read_csv(file_path, encoding='latin1', engine='pyarrow', parse_dates=['P.O. Date'])
+
+# Function that reuses a local Parquet copy of a file when the file hasn't changed
+def read_with_parquet_cache(file_path, read_file):
+    """
+    Reads a file into a Dataframe through a local Parquet cache.
+    The cache is used as long as it is newer than the file and was written by the current CACHE_VERSION,
+    otherwise the file is read again and the cache rewritten.
+
+    Parameters:
+        file_path: string
+            Path of the Excel or CSV file
+        read_file: function
+            Named function that reads file_path into a Dataframe, its name is part of the cache name
+    Returns:
+        Dataframe of the file's data
+    """
+    #cache is kept in the working directory so nothing gets written to the shared folder
+    #the reader's name is part of the cache name, so readers (including the other SQR script's) never share a cache
+    #the version is part of the name, so a cache of an older reader's output is never read
+    cache_path = f'{os.path.basename(file_path)}.{read_file.__name__}.v{CACHE_VERSION}.parquet'
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+        return pd.read_parquet(cache_path)
+
+    df = read_file(file_path)
+    #writing to a temporary file first and swapping it in, so an interrupted run never leaves a half-written cache
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except (ValueError, TypeError):
+        #columns with mixed types can't be stored in Parquet, the file will just be read again next run
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return df
+
+@st.cache_data
+# Function that loads the DMR Log, cached across Streamlit reruns
+def load_DMR_log(DMR_path, DMR_mtime):
+    """
+    Loads the DMR Log Excel file. DMR_mtime is only part of the cache key so a changed file is read again.
+    """
+    return read_with_parquet_cache(DMR_path, read_raw_DMR_log)
+
+@st.cache_data
+# Function that loads the Supplier PO List, cached across Streamlit reruns
+def load_PO_list(PO_path, PO_mtime):
+    """
+    Loads the Supplier PO List CSV file. PO_mtime is only part of the cache key so a changed file is read again.
+    """
+    return read_with_parquet_cache(PO_path, read_raw_PO_list)
+
+@st.cache_data
+# Function that loads the top key suppliers, cached across Streamlit reruns
+def load_key_suppliers(file_path, file_mtime):
+    """
+    Reads the top key suppliers CSV file.
+
+    Parameters:
+        file_path: string
+            Path of the top key suppliers CSV file
+        file_mtime: float
+            Modification time of the file, only part of the cache key so a changed file is read again
+    Returns:
+        numpy array: Unique capitalized supplier names
+    """
+    #making the suppliers capitalized for consistency with the DMR vendors
+    return pd.read_csv(file_path)['Top 20 Key Suppliers'].dropna().str.upper().unique()
+
+@st.cache_data
+# Function that runs the whole SQR calculation, cached on the modification times of the input files
+def build_SQR_tables(DMR_path, PO_path, DMR_mtime, PO_mtime):
+    """
+    Reads the DMR Log and Supplier PO List and calculates the yearly, monthly and vendor SQR percentages.
+    The modification times are only used as part of the cache key, so the tables are rebuilt when a file changes.
+
+    Parameters:
+        DMR_path: string
+            Path of the DMR Log Excel file
+        PO_path: string
+            Path of the Supplier PO List CSV file
+        DMR_mtime: float
+            Modification time of the DMR Log
+        PO_mtime: float
+            Modification time of the Supplier PO List
+    Returns:
+        tuple: DMR dataframe, PO dataframe, yearly SQR dataframe, monthly SQR dataframe,
+            vendor SQR dataframe, list of the years in both the DMR and PO data (newest first)
+    """
+    DMR_df = load_DMR_log(DMR_path, DMR_mtime)
+    supplier_PO_df = load_PO_list(PO_path, PO_mtime)
+
+    #parsing the dates once, dates that can't be parsed become NaT
+    DMR_df['Date'] = pd.to_datetime(DMR_df['Date'], errors='coerce')
+
+    dmrs_years = generate_unique_list(DMR_df['Date'], 'Year')
+    PO_years = generate_unique_list(supplier_PO_df['P.O. Date'], 'Year')
+
+    DMRs_yrs_count = pd.Series(generate_count_dict(DMR_df, 'Year', 'Date', dmrs_years), dtype=float)
+    PO_yrs_count = pd.Series(generate_count_dict(supplier_PO_df, 'Year', 'P.O. Date', PO_years), dtype=float)
+
+    #calcualting DMR to PO percentage ratio for each DMR year in one aligned divide, years without POs are left empty
+    DMR_PO_perc_yr = DMRs_yrs_count.div(PO_yrs_count.replace(0, np.nan)).mul(100).reindex(DMRs_yrs_count.index)
 
     #need to go through every month IN EACH YR and get the SQR calculations
     unique_months = ['01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12']
 
-    DMRs_month_count = generate_count_dict(DMR_df, 'Month', 'Date', unique_months)
-    PO_month_count = generate_count_dict(supplier_PO_df, 'Month', 'P.O. Date', unique_months)
-
-    #creating DMR to PO percentage ratio dictionary
-    DMR_PO_perc_month = {}
-
-    for year in sorted(set(DMRs_month_count.keys()) & set(PO_month_count.keys())):
-        year_ratio = {}
-        for month in PO_month_count[year]:
-            if month in PO_month_count[year]:
-                dmr_count = DMRs_month_count[year][month]
-                po_count = PO_month_count[year][month]
-                if po_count !=0:
-                    ratio = (dmr_count/po_count) *100
-                    year_ratio[month]=ratio
-        DMR_PO_perc_month[year]=year_ratio
-
-    #converting the yearly and monthly ratios to dataframes
-    df_yr = pd.DataFrame(DMR_PO_perc_yr, index = ['SQR Percentage'])
+    #month x year tables of the DMR and PO counts
+    DMRs_month_count = pd.DataFrame(generate_count_dict(DMR_df, 'Month', 'Date', unique_months))
+    PO_month_count = pd.DataFrame(generate_count_dict(supplier_PO_df, 'Month', 'P.O. Date', unique_months))
+
+    #calculating the DMR to PO ratio for the years in both tables, months without POs are left empty
+    common_years = sorted(set(DMRs_month_count.columns) & set(PO_month_count.columns))
+    DMR_PO_perc_month = DMRs_month_count[common_years].div(PO_month_count[common_years].replace(0, np.nan)).mul(100)
+
+    #converting the yearly ratios to a dataframe
+    df_yr = DMR_PO_perc_yr.to_frame('SQR Percentage').T
     #making sure that the only years are numbers & nothing else
     df_yr = df_yr[[col for col in df_yr.columns if col.isdigit()]]
-    df_month = pd.DataFrame(DMR_PO_perc_month)
+    #only keeping months that have a ratio in at least one year
+    df_month = DMR_PO_perc_month.dropna(how='all')
     df_month.index.name='Month'
 
     #rounding the SQR percents to 1 decimal point
@@ -277,85 +440,76 @@ if DMR_df is not None and supplier_PO_df is not None:
     df_month = df_month.round(1)
 
     #creating dataframe that holds the vendors DMR count and the coresponding year
-    DMR_df['Year'] = DMR_df['Date'].str[:4]
-    # Filtering out rows where 'Year' is not a valid year
-    DMR_df = DMR_df[DMR_df['Year'].str.isdigit()]
+    DMR_df['Year'] = DMR_df['Date'].dt.year
+    # Filtering out rows where 'Year' is not a valid year (dates that couldn't be parsed)
+    DMR_df = DMR_df.dropna(subset=['Year'])
     # Converting 'Year' to integer type
-    DMR_df['Year'] = DMR_df['Year'].astype(int)
-    # Grouping the DataFrame by 'Year' and 'Vendor' and counting the occurrences
-    vendors_yr_DMR_count_df = DMR_df.groupby(['Year', 'Vendor']).size().reset_index(name='DMR Count')
+    DMR_df['Year'] = DMR_df['Year'].astype('int32')
+    # Capitalizing the vendors for consistency and storing them as categories so grouping/filtering works on integer codes
+    DMR_df['Vendor'] = DMR_df['Vendor'].str.upper().astype('category')
 
     #creating Dataframe for the POs vendor count 
-    supplier_PO_df['Year'] = supplier_PO_df['P.O. Date'].str[:4]
+    supplier_PO_df['Year'] = supplier_PO_df['P.O. Date'].dt.year
     # Filtering out rows where 'Year' is not a valid year
-    supplier_PO_df = supplier_PO_df[supplier_PO_df['Year'].str.isdigit()]
+    supplier_PO_df = supplier_PO_df.dropna(subset=['Year'])
     # Converting 'Year' to integer type
-    supplier_PO_df['Year'] = supplier_PO_df['Year'].astype(int)
-    # Grouping the DataFrame by 'Year' and 'Vendor' and counting the occurrences
-    vendors_yr_PO_count_df = supplier_PO_df.groupby(['Year', 'Vendor Name']).size().reset_index(name='DMR Count')
-
-    #creating dictionaries to hold the DMR + PO vendors counts
-    vendor_DMR_counts = {}
-    vendor_PO_counts = {}
-
-    #iterates through each row in the dataframe
-    #row = pandas series of the vendors year data
-    for index, row in vendors_yr_DMR_count_df.iterrows():
-        #extracting the year, vendor, + count from the row Series
-        year = row['Year']
-        vendor = row['Vendor']
-        count = row['DMR Count']
-        #checking if the given vendor is present as a key in 'vendor_DMR_counts'
-        if vendor not in vendor_DMR_counts:
-            #initialiszes an empty dictionary for that vendor
-            vendor_DMR_counts[vendor] = {}
-        #adds an entry to the dictionary
-        vendor_DMR_counts[vendor][year] = count
-
-    #same thing as above but for the PO dictionary
-    for index, row in vendors_yr_PO_count_df.iterrows():
-        year = row['Year']
-        vendor = row['Vendor Name']
-        count = row['DMR Count']
-        if vendor not in vendor_PO_counts:
-            vendor_PO_counts[vendor]={}
-
-        vendor_PO_counts[vendor][year] = count
-
-    #creating DMR to PO percentage ratio dictionary
-    vendor_SQR_ratios = {}
-    #iterates over the items in 'vendor_DMR_counts'
-    for vendor, dmr_counts_per_year in vendor_DMR_counts.items():
-        #checking if vendor is a part of 'vendor_SQR_ratios'
-        if vendor not in vendor_SQR_ratios:
-            vendor_SQR_ratios[vendor] = {} #creates new dictionary slot for new vendor
-        #iterates through the years in dictionary
-        for year in dmr_counts_per_year:
-            #checks if vendor exists in 'vendor_PO_counts' dictionary and if year exists for that vendor
-            if vendor in vendor_PO_counts and year in vendor_PO_counts[vendor]:
-                #retrives the PO count for current vendor and year
-                po_count = vendor_PO_counts[vendor][year]
-                #checks if po_count is not zero
-                if po_count !=0:
-                    #gets dmr count for current vendor and year
-                    dmr_count = dmr_counts_per_year[year]
-                    #calculates the SQR percentage
-                    ratio = (dmr_count/po_count) *100
-                    #stores the calculated SQR percentage in the 'vendor_SQR_ratio' dictionary
-                    vendor_SQR_ratios[vendor][year]=ratio
-            else:
-                #assigns None to the SQR ratio
-                vendor_SQR_ratios[vendor][year]= None
-
-    #converting the 'vendor_SQR_ratios' dictionary to a dataframe
-    df_vendor_SQR_ratios = pd.DataFrame(vendor_SQR_ratios)
-    #transposing dataframe so it is easier to use
-    df_vendor_SQR_ratios = df_vendor_SQR_ratios.T
-
-    df_vendor_SQR_ratios.reset_index(inplace=True)
-    #renaming columns to have vendor
-    df_vendor_SQR_ratios.rename(columns={'index':'Vendor'}, inplace = True)
+    supplier_PO_df['Year'] = supplier_PO_df['Year'].astype('int32')
+    supplier_PO_df['Vendor Name'] = supplier_PO_df['Vendor Name'].str.upper().astype('category')
+
+    #counting the DMRs and POs of every vendor in every year straight into vendor x year tables
+    dmr_ct = pd.crosstab(DMR_df['Vendor'], DMR_df['Year'])
+    po_ct = pd.crosstab(supplier_PO_df['Vendor Name'].rename('Vendor'), supplier_PO_df['Year'])
+    #years a vendor had no DMRs are left empty, and vendors with no DMRs at all (unused categories) are dropped
+    dmr_ct = dmr_ct.where(dmr_ct > 0).dropna(how='all')
+    #lining the PO counts up with the DMR vendors and years, vendors/years without POs are counted as 0
+    dmr_ct, po_ct = dmr_ct.align(po_ct, join='left', fill_value=0)
 
+    #calculating the SQR percentage for every vendor and year at once, zero PO counts are left as NaN
+    df_vendor_SQR_ratios = (dmr_ct.div(po_ct.where(po_ct > 0)) * 100).reset_index().rename_axis(columns=None)
+
+    # Getting the years in both the PO and DMR data for the bar charts, newest first
+    unique_years = sorted(set(PO_years).intersection(dmrs_years), reverse=True)
+
+    return DMR_df, supplier_PO_df, df_yr, df_month, df_vendor_SQR_ratios, unique_years
+
+@st.cache_data
+# Function that builds the data of the PBC section, cached on the modification times of the input files
+def build_PBC_tables(DMR_path, PO_path, key_suppliers_path, DMR_mtime, PO_mtime, key_suppliers_mtime):
+    """
+    Filters the DMR Log down to the top key suppliers, gets the options of the PBC selectboxes and counts their monthly DMRs.
+    The cache key is only the paths and modification times, so the DMR dataframe isn't hashed on every rerun.
+
+    Parameters:
+        DMR_path: string
+            Path of the DMR Log Excel file
+        PO_path: string
+            Path of the Supplier PO List CSV file
+        key_suppliers_path: string
+            Path of the top key suppliers CSV file
+        DMR_mtime, PO_mtime, key_suppliers_mtime: float
+            Modification times of the three files
+    Returns:
+        tuple: sorted unique key suppliers in the DMR Log, sorted unique years of their DMRs as ints,
+            monthly DMR counts of the key suppliers (from count_monthly_DMRs)
+    """
+    DMR_df = build_SQR_tables(DMR_path, PO_path, DMR_mtime, PO_mtime)[0]
+    #filtering the suppliers in the DMR dataframe, Vendor is categorical so this matches on the category codes
+    filtered_dmr_df = DMR_df[DMR_df['Vendor'].isin(load_key_suppliers(key_suppliers_path, key_suppliers_mtime))]
+
+    PBC_vendors = tuple(sorted(filtered_dmr_df['Vendor'].dropna().unique()))
+    PBC_years = tuple(int(year) for year in sorted(filtered_dmr_df['Year'].unique()))
+    return PBC_vendors, PBC_years, count_monthly_DMRs(filtered_dmr_df)
+
+DMR_path = "Example_DMR_Log.xlsx"
+PO_path = "Example_Supplier PO List.csv"
+key_suppliers_path = "Example_Top_Key_Suppliers.csv"
+DMR_df, supplier_PO_df, df_yr, df_month, df_vendor_SQR_ratios, unique_years = build_SQR_tables(
+    DMR_path, PO_path, os.path.getmtime(DMR_path), os.path.getmtime(PO_path))
+PBC_vendors, PBC_years, monthly_DMRs = build_PBC_tables(DMR_path, PO_path, key_suppliers_path, os.path.getmtime(DMR_path),
+                                                        os.path.getmtime(PO_path), os.path.getmtime(key_suppliers_path))
+
+#checking if the DMR and PO dataframe has data in them
+if DMR_df is not None and supplier_PO_df is not None:
     #START OF: Code for the dashboard continued
     st.info("This is a sample of what the dashboard looks like. The official one requires users to upload\
     the needed files.")
@@ -375,13 +529,15 @@ if DMR_df is not None and supplier_PO_df is not None:
     st.subheader("Yearly Top 8 Supplier Quality Ratios")
     col1 = st.columns([1,1])
 
+    # Generate the bar charts for every year at the same time, they don't depend on each other
+    # the worker threads get this session's context so the cached function works in them
+    with ThreadPoolExecutor(max_workers=4, initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx())) as executor:
+        bar_charts = list(executor.map(lambda year: generate_SQR_bar_chart(df_vendor_SQR_ratios, int(year)), unique_years))
+
     # Display the bar charts for each year
-    unique_years = sorted(set(PO_years).intersection(dmrs_years), reverse=True)
     n = 0
-    for year in unique_years:
+    for bar_chart in bar_charts:
         with col1[n]:
-            # Generate the bar chart
-            bar_chart = generate_SQR_bar_chart(df_vendor_SQR_ratios, int(year))
             # Display the bar chart using Streamlit's st.plotly_chart function
             st.plotly_chart(bar_chart, use_container_width=True)
             n+=1
@@ -389,23 +545,19 @@ if DMR_df is not None and supplier_PO_df is not None:
                 n=0
     
     st.subheader('Process Behvaior Charts of DMR Log for Specfic Vendors and Years')
-    #reading in the top 20 key suppliers to filter through the suppliers in the DMR log for the PBC 
-    top_20_key_suppliers = pd.read_csv("Example_Top_Key_Suppliers.csv")
-    #making the suppliers capitalized for consistency
-    top_20_key_suppliers["Top 20 Key Suppliers"] = top_20_key_suppliers['Top 20 Key Suppliers'].str.upper()
-    DMR_df["Vendor"] = DMR_df['Vendor'].str.upper()
-    #filtering the suppliers in the DMR dataframe
-    filtered_dmr_df = DMR_df[DMR_df['Vendor'].isin(top_20_key_suppliers['Top 20 Key Suppliers'])]
-
+    #the PBC options and monthly counts only cover the top 20 key suppliers (filtered in build_PBC_tables)
     col2 = st.columns([1,1,1])
     #crating selectboxes for the use to select a vendor and a respective year
     with col2[0]:
-        vendor_interested = st.selectbox("Select a Vendor: ", filtered_dmr_df['Vendor'].unique())
+        vendor_interested = st.selectbox("Select a Vendor: ", PBC_vendors)
     with col2[1]:
-        year_interested = st.selectbox("Select Year: ", pd.to_datetime(filtered_dmr_df['Date'], errors='coerce').dt.year.dropna().unique())
+        year_interested = st.selectbox("Select Year: ", PBC_years)
+    with col2[2]:
+        #Kaleido export is much slower, so it's only used when asked for
+        high_resolution = st.checkbox("High-resolution export")
     try:
         #making the PBC chart
-        plot_buffer = calculate_and_plot_pbc(vendor_interested, year_interested, filtered_dmr_df)
+        plot_buffer = calculate_and_plot_pbc(vendor_interested, year_interested, monthly_DMRs, high_resolution)
         with col2[2]:
             #making a Download button for the PBC chart
             st.write("Download PBC Chart")